@@ -4,22 +4,11 @@ This script patches streamlitui.py to fix the SecretStr issue
 when handling environment variables.
 """
 
-import re
+_SECRETSTR_PREFIX = "api_key=SecretStr("
 
-# Read the original file
-with open('streamlitui.py', 'r') as file:
-    content = file.read()
-
-# Replace SecretStr usage with direct string references
-# Pattern 1: Replace all SecretStr instances
-content = re.sub(
-    r'api_key=SecretStr\(([^)]+)\)', 
-    r'api_key=\1', 
-    content
-)
+_DEBUG_BLOCK_MARKER = "\n\n# Add a debug block at the end of the file"
 
-# Check for commented print statements for debugging
-content += """
+_DEBUG_BLOCK = """
 
 # Add a debug block at the end of the file
 if __name__ == "__main__":
@@ -29,8 +18,47 @@ if __name__ == "__main__":
     print(f"DEBUG: WEAVIATE_API_KEY exists: {os.environ.get('WEAVIATE_API_KEY') is not None}")
 """
 
+
+def strip_secretstr(content):
+    """Rewrite api_key=SecretStr(<expr>) to api_key=<expr>.
+
+    The pattern is a fixed literal around a paren-free argument, so a
+    str.find scan does the job without dragging in the regex engine.
+    """
+    out = []
+    i = 0
+    while True:
+        j = content.find(_SECRETSTR_PREFIX, i)
+        if j < 0:
+            out.append(content[i:])
+            break
+        k = content.find(")", j)
+        if k < 0:
+            out.append(content[i:])
+            break
+        out.append(content[i:j])
+        out.append("api_key=")
+        out.append(content[j + len(_SECRETSTR_PREFIX):k])
+        i = k + 1
+    return "".join(out)
+
+
+# Read the original file
+with open('streamlitui.py', 'r') as file:
+    content = file.read()
+
+# Replace SecretStr usage with direct string references
+content = strip_secretstr(content)
+
+# Truncate at the first previously appended debug block (if any), then
+# append exactly one, so re-runs don't stack duplicates
+marker_pos = content.find(_DEBUG_BLOCK_MARKER)
+if marker_pos != -1:
+    content = content[:marker_pos]
+content += _DEBUG_BLOCK
+
 # Write the fixed content back
 with open('streamlitui.py', 'w') as file:
     file.write(content)
 
-print("✅ Successfully patched streamlitui.py to fix SecretStr usage!") 
\ No newline at end of file
+print("✅ Successfully patched streamlitui.py to fix SecretStr usage!")
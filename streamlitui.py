@@ -1,25 +1,17 @@
 # Import necessary libraries
+# Heavy third-party modules (weaviate, langchain_*, pypdf) are imported
+# lazily inside the functions that need them so a cold start only pays the
+# import cost for what the session actually uses
 import os
-import tempfile
+import io
 import streamlit as st
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
-from langchain_community.document_loaders import (
-    PyPDFLoader,
-    WebBaseLoader,
-    WikipediaLoader,
-    TextLoader,
-)
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 import socket
 import logging
-import weaviate
-from weaviate.classes.init import Auth
-from langchain_weaviate import WeaviateVectorStore
-from pydantic import SecretStr
+import atexit
+import hashlib
+import functools
+from concurrent.futures import ThreadPoolExecutor
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -36,21 +28,44 @@ WEAVIATE_API_KEY = os.environ.get("WEAVIATE_API_KEY")
 # Vector DB settings
 WEAVIATE_CLASS_NAME = "SFBUDocuments"
 
+# How many chunks to embed and upsert per worker batch
+EMBED_BATCH_SIZE = 256
+
+# Embedding width requested from OpenAI and expected in the collection.
+# Changing this requires dropping and re-ingesting the Weaviate collection -
+# stored vectors keep their original width
+EMBED_DIMENSIONS = 512
+
+# Splitter separators, coarsest first; a tuple so the splitter's recursive
+# walk iterates and slices an immutable constant instead of a fresh list
+SPLITTER_SEPARATORS = ("\n\n", "\n", " ", "")
+
 logger.info("Using OpenAI for embeddings and Weaviate for vector storage")
 
 # Initialize Streamlit app state
 if "has_documents" not in st.session_state:
     st.session_state.has_documents = False
 
+if "seen_chunk_hashes" not in st.session_state:
+    st.session_state.seen_chunk_hashes = set()
+
 
 # Determine if this pod should be the writer pod
+# Pod identity can't change during the process lifetime, so compute it once
+# instead of re-reading /etc/podinfo/role on every rerun
+@functools.lru_cache(maxsize=1)
 def is_writer_pod():
-    # Check if there's a podinfo role file
-    role_file = "/etc/podinfo/role"
-    if os.path.exists(role_file):
-        with open(role_file, "r") as f:
-            role = f.read().strip()
-            return role == "writer"
+    # Check if there's a podinfo role file; open directly and let
+    # FileNotFoundError signal absence instead of a separate exists() stat
+    try:
+        fd = os.open("/etc/podinfo/role", os.O_RDONLY)
+        try:
+            role = os.read(fd, 64).decode().strip()
+        finally:
+            os.close(fd)
+        return role == "writer"
+    except FileNotFoundError:
+        pass
 
     # Fallback logic for local development
     hostname = socket.gethostname()
@@ -76,23 +91,40 @@ def is_writer_pod():
         if pod_suffix.isdigit():
             pod_number = int(pod_suffix)
             
-    # If we couldn't extract a number or it's not a StatefulSet, use first hostname alphabetically
+    # If we couldn't extract a number or it's not a StatefulSet, assume we're
+    # the only pod and take the writer role; we have no view of our peers
+    # here, so there's nothing to coordinate on
     if pod_number == -1:
-        return hostname == sorted([hostname])[0]
+        return True
     else:
         # The first pod (index 0) becomes the writer
         return pod_number == 0
 
 
+# Shared HTTP transport for the OpenAI chat and embeddings clients so both
+# reuse warm keep-alive connections instead of paying a TLS handshake per
+# burst of requests
+@st.cache_resource
+def init_http_client():
+    import httpx
+
+    return httpx.Client(
+        limits=httpx.Limits(max_keepalive_connections=20, keepalive_expiry=60)
+    )
+
+
 # Initialize OpenAI client
+@st.cache_resource
 def init_openai():
     try:
+        from langchain_openai import ChatOpenAI
+
         if not OPENAI_API_KEY:
             logger.error("No OpenAI API key found.")
             st.error("OpenAI API key is required. Please set OPENAI_API_KEY in your .env file.")
             st.stop()
             
-        client = ChatOpenAI(api_key=OPENAI_API_KEY)
+        client = ChatOpenAI(api_key=OPENAI_API_KEY, http_client=init_http_client())
         logger.info("OpenAI client initialized successfully")
         return client
     except Exception as e:
@@ -101,14 +133,29 @@ def init_openai():
 
 
 # Initialize OpenAI Embeddings
+@st.cache_resource
 def init_openai_embeddings():
     try:
+        from langchain_openai import OpenAIEmbeddings
+
         if not OPENAI_API_KEY:
             logger.error("No OpenAI API key found.")
             st.error("OpenAI API key is required. Please set OPENAI_API_KEY in your .env file.")
             st.stop()
             
-        embeddings = OpenAIEmbeddings(api_key=OPENAI_API_KEY)
+        # Pin the model (the default is the older ada-002, which doesn't
+        # match the collection's vectorizer) and truncate vectors server-side
+        # to 512 dims - 3x less payload, HNSW memory, and distance work.
+        # chunk_size packs up to 512 texts per embeddings request instead of
+        # one HTTP round-trip per chunk
+        embeddings = OpenAIEmbeddings(
+            api_key=OPENAI_API_KEY,
+            model="text-embedding-3-small",
+            dimensions=EMBED_DIMENSIONS,
+            chunk_size=512,
+            max_retries=6,
+            http_client=init_http_client(),
+        )
         logger.info("OpenAI embeddings initialized successfully")
         return embeddings
     except Exception as e:
@@ -117,8 +164,12 @@ def init_openai_embeddings():
 
 
 # Initialize Weaviate client
+@st.cache_resource
 def init_weaviate_client():
     try:
+        import weaviate
+        from weaviate.classes.init import Auth
+
         if not WEAVIATE_URL:
             logger.error("No Weaviate URL found.")
             st.error("Weaviate URL is required. Please set WEAVIATE_URL in your .env file.")
@@ -145,6 +196,11 @@ def init_weaviate_client():
             },
             skip_init_checks=True  # Skip gRPC health checks that might fail in some environments
         )
+        # Close the connection at interpreter exit; st.cache_resource has no
+        # eviction hook, so process teardown is the only reliable close point.
+        # Note: if a ttl/max_entries is ever added to this cache, evicted
+        # clients will leak until exit
+        atexit.register(client.close)
         logger.info("Weaviate client initialized successfully")
         return client
     except Exception as e:
@@ -153,21 +209,49 @@ def init_weaviate_client():
 
 
 # Initialize Vector Store
-def init_vector_store(embedding_function, weaviate_client):
+@st.cache_resource
+def init_vector_store():
     try:
+        import weaviate
+        from langchain_weaviate import WeaviateVectorStore
+
+        # Look up the cached clients internally so this factory stays
+        # argument-free (unhashable clients can't be cache keys)
+        embedding_function = init_openai_embeddings()
+        weaviate_client = init_weaviate_client()
         # Check if the schema already exists, if not create it
         collection_name = WEAVIATE_CLASS_NAME
-        
-        # Check if collection exists by attempting to get it
-        collection_exists = False
-        try:
-            weaviate_client.collections.get(collection_name)
-            collection_exists = True
+
+        # exists() is a single cheap round-trip, unlike probing with
+        # collections.get() and catching the failure
+        collection_exists = weaviate_client.collections.exists(collection_name)
+        if collection_exists:
             logger.info(f"Collection {collection_name} already exists")
-        except Exception as e:
+
+            # Guard against collections created before the move to
+            # EMBED_DIMENSIONS-wide embeddings: stored vectors keep their
+            # original width, so every insert and query would fail with a
+            # vector-length mismatch until the collection is re-ingested
+            stored_width = None
+            try:
+                sample = weaviate_client.collections.get(collection_name).query.fetch_objects(
+                    limit=1, include_vector=True
+                )
+                if sample.objects:
+                    vector = sample.objects[0].vector.get("default") or []
+                    stored_width = len(vector)
+            except Exception as e:
+                logger.warning(f"Couldn't verify vector dimensions: {str(e)}")
+
+            if stored_width and stored_width != EMBED_DIMENSIONS:
+                raise RuntimeError(
+                    f"Collection {collection_name} holds {stored_width}-dimension "
+                    f"vectors but embeddings are configured for {EMBED_DIMENSIONS}. "
+                    "Drop the collection and re-upload your documents to migrate."
+                )
+        else:
             logger.info(f"Collection {collection_name} does not exist, will create it")
-            collection_exists = False
-        
+
         # Create collection if it doesn't exist
         if not collection_exists:
             # Define the collection properties
@@ -176,11 +260,13 @@ def init_vector_store(embedding_function, weaviate_client):
                     name=collection_name,
                     vectorizer_config=weaviate.classes.config.Configure.Vectorizer.text2vec_openai(
                         model="text-embedding-3-small",
-                        model_version="latest"
+                        dimensions=EMBED_DIMENSIONS,  # Keep in sync with init_openai_embeddings
                     ),
                     properties=[
                         weaviate.classes.config.Property(name="content", data_type=weaviate.classes.config.DataType.TEXT),
                         weaviate.classes.config.Property(name="source", data_type=weaviate.classes.config.DataType.TEXT),
+                        # Chunk fingerprint used to skip re-embedding known content
+                        weaviate.classes.config.Property(name="content_hash", data_type=weaviate.classes.config.DataType.TEXT),
                         # Define nested properties for metadata as required by Weaviate
                         weaviate.classes.config.Property(
                             name="metadata", 
@@ -196,12 +282,10 @@ def init_vector_store(embedding_function, weaviate_client):
                 logger.info(f"Created Weaviate collection for class {collection_name}")
             except Exception as e:
                 logger.error(f"Error creating collection: {str(e)}")
-                # Try to get the collection again in case it was created
-                try:
-                    weaviate_client.collections.get(collection_name)
+                # Re-check in case another replica created it concurrently
+                if weaviate_client.collections.exists(collection_name):
                     logger.info(f"Collection {collection_name} exists despite creation error")
-                    collection_exists = True
-                except:
+                else:
                     raise
         
         # Initialize Weaviate vector store with LangChain using the updated class
@@ -212,18 +296,6 @@ def init_vector_store(embedding_function, weaviate_client):
             embedding=embedding_function
         )
         
-        # Check if it has documents
-        try:
-            collection = weaviate_client.collections.get(collection_name)
-            # Fix for v4 API - proper way to get collection count
-            count = collection.count()
-            
-            if count > 0:
-                logger.info(f"Found {count} documents in vector store")
-                st.session_state.has_documents = True
-        except Exception as e:
-            logger.warning(f"Couldn't get document count: {str(e)}")
-        
         return vector_store
     except Exception as e:
         logger.error(f"Error initializing vector store: {str(e)}")
@@ -238,7 +310,21 @@ weaviate_client = init_weaviate_client()
 # Only proceed if clients are properly initialized
 if llm and embeddings and weaviate_client:
     try:
-        vector_store = init_vector_store(embeddings, weaviate_client)
+        vector_store = init_vector_store()
+
+        # Check whether the collection already has documents (skipped once known)
+        if not st.session_state.has_documents:
+            try:
+                collection = weaviate_client.collections.get(WEAVIATE_CLASS_NAME)
+                # Fix for v4 API - proper way to get collection count
+                count = collection.count()
+
+                if count > 0:
+                    logger.info(f"Found {count} documents in vector store")
+                    st.session_state.has_documents = True
+            except Exception as e:
+                logger.warning(f"Couldn't get document count: {str(e)}")
+
         # Configure retriever for Weaviate - remove unsupported parameters
         retriever = vector_store.as_retriever(
             search_kwargs={
@@ -246,7 +332,6 @@ if llm and embeddings and weaviate_client:
                 "alpha": 0.75,      # Balance between vector (higher) and keyword search
             }
         )
-        string_parser = StrOutputParser()
     except Exception as e:
         st.error(f"Failed to initialize vector store: {str(e)}")
         vector_store = None
@@ -257,29 +342,91 @@ else:
     st.error("Initialization failed. Please check your API keys and Weaviate URL.")
 
 # Define splitters and loaders
-splitter = RecursiveCharacterTextSplitter(
-    separators=["\n\n", "\n", " ", ""],
-    chunk_size=1000,
-    chunk_overlap=200,
-    length_function=len,
-    is_separator_regex=False,
-)
+@st.cache_resource
+def init_splitter():
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(
+        separators=SPLITTER_SEPARATORS,
+        chunk_size=1000,
+        chunk_overlap=200,
+        length_function=len,
+        is_separator_regex=False,
+    )
+
 
+def _dedup_chunks(docs):
+    # Drop chunks whose content was already stored this session; every
+    # duplicate skipped saves an OpenAI embeddings call and a Weaviate upsert.
+    # Hashes are recorded in embed_documents only after a successful upsert,
+    # so a failed upload stays retryable with the same content
+    seen = st.session_state.seen_chunk_hashes
+
+    unique_docs = []
+    batch_seen = set()
+    for doc in docs:
+        digest = hashlib.blake2b(
+            doc.page_content.encode(), digest_size=16
+        ).hexdigest()
+        if digest not in seen and digest not in batch_seen:
+            batch_seen.add(digest)
+            unique_docs.append(doc)
+
+    skipped = len(docs) - len(unique_docs)
+    if skipped:
+        logger.info(f"Skipping {skipped} duplicate chunks already seen this session")
+    return unique_docs
+
+
+# Parsing and splitting are deterministic given the upload bytes and splitter
+# params, so memoize on the content hash; re-uploads and rerun double-clicks
+# skip the pypdf parse and splitter traversal entirely. _raw is underscored so
+# Streamlit keys the cache on the hash instead of re-hashing the whole payload
+@st.cache_data(max_entries=32, show_spinner=False)
+def _split_bytes(content_hash, _raw, loader_type):
+    from langchain_core.documents import Document
 
-def load_documents(file_path, loader_type="pdf"):
     if loader_type == "pdf":
-        loader = PyPDFLoader(file_path)
-    elif loader_type == "text":
-        loader = TextLoader(file_path, encoding="utf-8")
-    elif loader_type == "web":
-        loader = WebBaseLoader(file_path)
+        from pypdf import PdfReader
+
+        # _raw is the raw upload bytes; parse in memory instead of
+        # spilling to a temp file that PyPDFLoader would re-read
+        reader = PdfReader(io.BytesIO(_raw))
+        loaded_docs = [
+            Document(page_content=page.extract_text() or "", metadata={"page": i})
+            for i, page in enumerate(reader.pages)
+        ]
+    else:
+        loaded_docs = [Document(page_content=bytes(_raw).decode("utf-8"))]
+
+    return init_splitter().split_documents(loaded_docs)
+
+
+def load_documents(source, loader_type="pdf"):
+    if loader_type in ("pdf", "text"):
+        content_hash = hashlib.blake2b(bytes(source), digest_size=16).hexdigest()
+        return _dedup_chunks(_split_bytes(content_hash, source, loader_type))
+
+    if loader_type == "web":
+        from langchain_community.document_loaders import WebBaseLoader
+
+        # Accept several comma/newline-separated URLs and fetch them in
+        # parallel; each fetch is network-bound so threads overlap the RTTs
+        urls = [u.strip() for u in source.replace("\n", ",").split(",") if u.strip()]
+        if len(urls) > 1:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                results = executor.map(lambda url: WebBaseLoader(url).load(), urls)
+            loaded_docs = [doc for docs in results for doc in docs]
+        else:
+            loaded_docs = WebBaseLoader(source).load()
     elif loader_type == "wiki":
-        loader = WikipediaLoader(query=file_path, load_max_docs=2)
+        from langchain_community.document_loaders import WikipediaLoader
+
+        loaded_docs = WikipediaLoader(query=source, load_max_docs=2).load()
     else:
         raise ValueError("Unsupported loader type.")
 
-    loaded_docs = loader.load()
-    return splitter.split_documents(loaded_docs)
+    return _dedup_chunks(init_splitter().split_documents(loaded_docs))
 
 
 def embed_documents(docs):
@@ -294,10 +441,66 @@ def embed_documents(docs):
         )
         return False
 
+    # Everything was deduplicated away at load time, i.e. these chunks are
+    # already stored; don't bother Weaviate with an empty filter
+    if not docs:
+        st.session_state.has_documents = True
+        st.success("Documents already embedded - nothing new to add!")
+        return True
+
+    for doc in docs:
+        doc.metadata["content_hash"] = hashlib.blake2b(
+            doc.page_content.encode(), digest_size=16
+        ).hexdigest()
+    hashes = list({doc.metadata["content_hash"] for doc in docs})
+
+    # Ask Weaviate which chunk hashes it already stores and only embed the
+    # complement; one filter query is far cheaper than re-embedding
+    if hashes:
+        try:
+            from weaviate.classes.query import Filter
+
+            collection = weaviate_client.collections.get(WEAVIATE_CLASS_NAME)
+            existing = collection.query.fetch_objects(
+                filters=Filter.by_property("content_hash").contains_any(hashes),
+                limit=len(hashes),
+                return_properties=["content_hash"],
+            )
+            known = {obj.properties.get("content_hash") for obj in existing.objects}
+            if known:
+                docs = [doc for doc in docs if doc.metadata["content_hash"] not in known]
+                # Already stored in Weaviate, so they count as seen for this session
+                st.session_state.seen_chunk_hashes.update(known)
+                logger.info(f"Skipping {len(known)} chunks already stored in Weaviate")
+        except Exception as e:
+            logger.warning(f"Content-hash preflight failed, embedding all chunks: {str(e)}")
+
+    if not docs:
+        st.session_state.has_documents = True
+        st.success("Documents already embedded - nothing new to add!")
+        return True
+
     try:
-        # Add documents to vector store
-        vector_store.add_documents(docs)
+        # Add documents to vector store in parallel batches; the Weaviate v4
+        # client is thread-safe for inserts, so throughput is bound by the
+        # OpenAI rate limit instead of single-stream latency
+        batches = [
+            docs[i : i + EMBED_BATCH_SIZE]
+            for i in range(0, len(docs), EMBED_BATCH_SIZE)
+        ]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [
+                executor.submit(vector_store.add_documents, batch)
+                for batch in batches
+            ]
+            for future in futures:
+                future.result()
         st.session_state.has_documents = True
+        # Record the hashes only now that the upsert succeeded, so a failed
+        # attempt can be retried with the same upload
+        st.session_state.seen_chunk_hashes.update(
+            doc.metadata["content_hash"] for doc in docs
+        )
         st.success("Documents embedded successfully!")
         return True
     except Exception as e:
@@ -305,19 +508,17 @@ def embed_documents(docs):
         return False
 
 
-def rag_chatbot_app(question):
-    if not retriever:
-        return "Error: Vector store not initialized. Please check your API keys and Weaviate URL."
-
-    if not st.session_state.has_documents:
-        return (
-            "No documents found in the knowledge base. Please upload documents first."
-        )
+# Build the RAG chain once per worker; prompt-template parsing and Runnable
+# wiring don't depend on the question, so they don't belong in the hot path
+@st.cache_resource
+def get_chain():
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.runnables import RunnablePassthrough
 
     # Improved system prompt for better context processing
     system_prompt = """You are a helpful AI assistant for SFBU (South Bay for Business University).
-Answer user questions based ONLY on the following context information. 
-If the context doesn't contain relevant information to answer the question, just say 
+Answer user questions based ONLY on the following context information.
+If the context doesn't contain relevant information to answer the question, just say
 "I don't have enough information to answer that question based on the available context."
 Don't make up or infer information that's not in the context.
 
@@ -327,22 +528,29 @@ Context: {context}
         [("system", system_prompt), ("user", "{question}")]
     )
 
-    try:
-        # Skip the chain if LLM is not initialized properly
-        if not llm:
-            return "Error: LLM not initialized properly."
-            
-        retrieval_chain = {"context": retriever, "question": RunnablePassthrough()}
-        main_chain = (
-            retrieval_chain 
-            | main_prompt 
-            | llm 
-            | string_parser
+    # No StrOutputParser here: for plain invoke() the AIMessage already
+    # carries the text, so the extra Runnable layer is pure overhead
+    retrieval_chain = {"context": retriever, "question": RunnablePassthrough()}
+    return retrieval_chain | main_prompt | llm
+
+
+def rag_chatbot_app(question):
+    if not retriever:
+        return "Error: Vector store not initialized. Please check your API keys and Weaviate URL."
+
+    if not st.session_state.has_documents:
+        return (
+            "No documents found in the knowledge base. Please upload documents first."
         )
-        return main_chain.invoke(question)
-    except Exception as e:
-        logger.error(f"Error in RAG chain: {str(e)}")
-        return f"An error occurred: {str(e)}"
+
+    # Skip the chain if LLM is not initialized properly
+    if not llm:
+        return "Error: LLM not initialized properly."
+
+    # Return a token generator so the caller can feed st.write_stream and
+    # show the first token immediately instead of blocking on the full
+    # completion; retrieval still happens once up front on first next()
+    return (chunk.content for chunk in get_chain().stream(question))
 
 
 # Streamlit UI Setup
@@ -372,47 +580,29 @@ if is_writer_pod():
     if doc_type == "PDF":
         uploaded_file = st.file_uploader("Upload a PDF file", type="pdf")
         if uploaded_file is not None:
-            # Create a temporary file to process the PDF
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-                tmp_file.write(uploaded_file.getbuffer())
-                temp_path = tmp_file.name
-
             if st.button("Process PDF"):
                 with st.spinner("Processing PDF..."):
                     try:
-                        docs = load_documents(temp_path, loader_type="pdf")
+                        docs = load_documents(uploaded_file.getvalue(), loader_type="pdf")
                         embed_documents(docs)
                         st.success(f"Processed {uploaded_file.name} successfully!")
                     except Exception as e:
                         st.error(f"Error processing PDF: {str(e)}")
-                    finally:
-                        # Clean up the temporary file
-                        if os.path.exists(temp_path):
-                            os.unlink(temp_path)
 
     elif doc_type == "Text":
         uploaded_file = st.file_uploader("Upload a Text file", type="txt")
         if uploaded_file is not None:
-            # Create a temporary file to process the text file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".txt") as tmp_file:
-                tmp_file.write(uploaded_file.getbuffer())
-                temp_path = tmp_file.name
-
             if st.button("Process Text File"):
                 with st.spinner("Processing text file..."):
                     try:
-                        docs = load_documents(temp_path, loader_type="text")
+                        docs = load_documents(uploaded_file.getvalue(), loader_type="text")
                         embed_documents(docs)
                         st.success(f"Processed {uploaded_file.name} successfully!")
                     except Exception as e:
                         st.error(f"Error processing text file: {str(e)}")
-                    finally:
-                        # Clean up the temporary file
-                        if os.path.exists(temp_path):
-                            os.unlink(temp_path)
 
     elif doc_type == "Web":
-        url = st.text_input("Enter a webpage URL:")
+        url = st.text_input("Enter webpage URL(s), comma-separated:")
         if url and st.button("Process Webpage"):
             with st.spinner("Processing webpage..."):
                 try:
@@ -450,61 +640,54 @@ if "openai_model" not in st.session_state:
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
-# Display chat history
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
-
-# User input
-if prompt := st.chat_input("Ask me anything based on the documents..."):
-    # Append user's message
-    st.session_state.messages.append({"role": "user", "content": prompt})
-    with st.chat_message("user"):
-        st.markdown(prompt)
-
-    # Get assistant's response
-    with st.chat_message("assistant"):
-        # Generate response from the RAG chatbot
-        with st.spinner("Thinking..."):
-            try:
-                response = rag_chatbot_app(prompt)
-                st.markdown(response)
-                # Append assistant's response
-                st.session_state.messages.append(
-                    {"role": "assistant", "content": response}
-                )
-            except Exception as e:
-                error_message = f"Error generating response: {str(e)}"
-                st.error(error_message)
-                # Append error message to chat history
-                st.session_state.messages.append(
-                    {"role": "assistant", "content": error_message}
-                )
-
-# Add cleanup function for proper client termination
-def cleanup():
-    if 'weaviate_client' in globals() and weaviate_client is not None:
-        try:
-            weaviate_client.close()
-            logger.info("Weaviate client closed properly")
-        except Exception as e:
-            logger.error(f"Error closing Weaviate client: {str(e)}")
-
-# Register cleanup function with Streamlit, if running in Streamlit mode
-try:
-    import atexit
-    atexit.register(cleanup)
-except Exception:
-    logger.warning("Could not register cleanup handler")
-
+# Chat runs in its own fragment so interactions with the upload widgets
+# don't re-markdown the whole conversation, and new chat messages don't
+# re-execute the rest of the page
+@st.fragment
+def render_chat():
+    history = st.container()
+
+    # Display chat history
+    with history:
+        for message in st.session_state.messages:
+            with st.chat_message(message["role"]):
+                st.markdown(message["content"])
+
+    # User input
+    if prompt := st.chat_input("Ask me anything based on the documents..."):
+        # Append user's message
+        st.session_state.messages.append({"role": "user", "content": prompt})
+        with history:
+            with st.chat_message("user"):
+                st.markdown(prompt)
+
+            # Get assistant's response
+            with st.chat_message("assistant"):
+                # Generate response from the RAG chatbot
+                try:
+                    result = rag_chatbot_app(prompt)
+                    if isinstance(result, str):
+                        # Initialization / empty-knowledge-base messages
+                        # come back as plain strings
+                        st.markdown(result)
+                        response = result
+                    else:
+                        # Stream tokens to the UI as they arrive
+                        response = st.write_stream(result)
+                    # Append assistant's response
+                    st.session_state.messages.append(
+                        {"role": "assistant", "content": response}
+                    )
+                except Exception as e:
+                    error_message = f"Error generating response: {str(e)}"
+                    st.error(error_message)
+                    # Append error message to chat history
+                    st.session_state.messages.append(
+                        {"role": "assistant", "content": error_message}
+                    )
 
-# Add a debug block at the end of the file
-if __name__ == "__main__":
-    import os
-    print(f"DEBUG: OPENAI_API_KEY exists: {os.environ.get('OPENAI_API_KEY') is not None}")
-    print(f"DEBUG: WEAVIATE_URL exists: {os.environ.get('WEAVIATE_URL') is not None}")
-    print(f"DEBUG: WEAVIATE_API_KEY exists: {os.environ.get('WEAVIATE_API_KEY') is not None}")
 
+render_chat()
 
 # Add a debug block at the end of the file
 if __name__ == "__main__":